@@ -1,36 +1,29 @@
-from flask import Flask, render_template, redirect, url_for, request, flash
+import click
+from flask import Flask, current_app, render_template, redirect, url_for, request, flash
+from flask.cli import with_appcontext
 from config import Config
+from couchdb_client import CouchDBClient
 from models import db, User, Tenant, Apartment, Building, Street
-from flask_login import LoginManager, login_user, logout_user, current_user, login_required
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_login import LoginManager
+from werkzeug.security import generate_password_hash
 from sqlalchemy import text
-
-# Create Flask app
-app = Flask(__name__)
-app.config.from_object(Config)
-
-# Initialize SQLAlchemy
-db.init_app(app)
+from services.occupancy_service import backfill_move_ins
+from services.bulk_tenants import OPERATIONS, bulk_operation, select_tenants
 
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
-login_manager.init_app(app)
 
 @login_manager.user_loader
 def load_user(user_id):
     """Load user by ID (required for Flask-Login)"""
     return User.query.get(int(user_id))
 
-from routes import register_blueprints
-register_blueprints(app)
 
-@app.route('/')
 def index():
     """Main page → redirect to login"""
     return redirect(url_for('auth.login'))
 
 
-@app.route('/register', methods=['GET', 'POST'])
 def register():
     """Register a new user (link to tenant by full name)"""
     if request.method == 'POST':
@@ -44,7 +37,7 @@ def register():
         except ValueError:
             flash("Enter full name in format: 'FirstName LastName'")
             return render_template('register.html')
-        
+
         # Check if username exists
         if User.query.filter_by(username=username).first():
             flash('User already exists')
@@ -77,53 +70,162 @@ def register():
     return render_template('register.html')
 
 
+def create_app(config=Config):
+    """
+    Application factory.
+    Heavy or optional subsystems (ReportLab, CouchDB client, certificate
+    archive) are imported on first use, and the schema is bootstrapped by
+    `flask --app app init-db`, not here.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config)
+
+    # Initialize SQLAlchemy
+    db.init_app(app)
+    login_manager.init_app(app)
+
+    from routes import register_blueprints
+    register_blueprints(app)
+
+    app.add_url_rule('/', view_func=index)
+    app.add_url_rule('/register', view_func=register, methods=['GET', 'POST'])
+
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(archive_certificates_command)
+    app.cli.add_command(compact_certificates_command)
+    app.cli.add_command(bulk_tenants_command)
+    return app
+
+
 def init_db():
-    """Check connection + create tables + add test data"""
-    try:
-        with app.app_context():
-            # Check database availability
-            db.session.execute(text('SELECT 1'))
-            print("Database connection successful!")
-
-            # Create tables
-            db.create_all()
-
-            # Add test data (first run)
-            if not Street.query.first():
-                street = Street(name="Test Street")
-                db.session.add(street)
-                db.session.commit()
-
-                building = Building(street_id=street.id, number="1")
-                db.session.add(building)
-                db.session.commit()
-
-                apartment = Apartment(
-                    building_id=building.id,
-                    number="1",
-                    area=50,
-                    rooms=2,
-                    ownership_type="Private"
-                )
-                db.session.add(apartment)
-                db.session.commit()
-
-                # Add admin
-                if not User.query.filter_by(username='admin').first():
-                    admin_user = User(
-                        username='admin',
-                        password_hash=generate_password_hash('admin'),
-                        role='admin'
-                    )
-                    db.session.add(admin_user)
-                    db.session.commit()
-
-                print("Test data added successfully!")
+    """Check connection + create tables + add test data (needs an app context)"""
+    # Check database availability
+    db.session.execute(text('SELECT 1'))
+    print("Database connection successful!")
+
+    # Create tables
+    db.create_all()
+
+    # Columns added after the first release (create_all does not alter existing tables)
+    db.session.execute(text('ALTER TABLE streets ADD COLUMN IF NOT EXISTS district VARCHAR(100)'))
+    db.session.execute(text('CREATE INDEX IF NOT EXISTS ix_streets_district ON streets (district)'))
+    db.session.commit()
+
+    # Occupancy history for tenants registered before the event log existed
+    backfilled = backfill_move_ins()
+    db.session.commit()
+    if backfilled:
+        print(f"Occupancy history: {backfilled} move-in events added")
+
+    # Add test data (first run)
+    if not Street.query.first():
+        street = Street(name="Test Street")
+        db.session.add(street)
+        db.session.commit()
+
+        building = Building(street_id=street.id, number="1")
+        db.session.add(building)
+        db.session.commit()
 
+        apartment = Apartment(
+            building_id=building.id,
+            number="1",
+            area=50,
+            rooms=2,
+            ownership_type="Private"
+        )
+        db.session.add(apartment)
+        db.session.commit()
+
+        # Add admin
+        if not User.query.filter_by(username='admin').first():
+            admin_user = User(
+                username='admin',
+                password_hash=generate_password_hash('admin'),
+                role='admin'
+            )
+            db.session.add(admin_user)
+            db.session.commit()
+
+        print("Test data added successfully!")
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create tables and add test data."""
+    try:
+        init_db()
     except Exception as e:
-        print(f"Error initializing database: {e}")
+        raise click.ClickException(f"Error initializing database: {e}")
+
+
+
+@click.command('archive-certificates')
+@click.option('--older-than-days', type=int, default=None,
+              help='Archive certificates older than this (default: CERTIFICATE_ARCHIVE_AGE_DAYS).')
+@with_appcontext
+def archive_certificates_command(older_than_days):
+    """Move old certificates from CouchDB to the local pack files."""
+    from services.certificate_archive import archive_old_certificates, get_archive
+
+    if older_than_days is None:
+        older_than_days = current_app.config['CERTIFICATE_ARCHIVE_AGE_DAYS']
+    archived = archive_old_certificates(CouchDBClient(), get_archive(current_app), older_than_days)
+    print(f"Archived {archived} certificates older than {older_than_days} days")
+
+
+@click.command('compact-certificates')
+@with_appcontext
+def compact_certificates_command():
+    """Rewrite the pack files keeping one copy of each distinct PDF per tenant."""
+    from services.certificate_archive import get_archive
+
+    with get_archive(current_app).writer() as writer:
+        summary = writer.compact()
+    print(f"{summary['certificates']} certificates, {summary['unique_pdfs']} distinct PDFs; "
+          f"packs {summary['bytes_before']} -> {summary['bytes_after']} bytes")
+
+
+@click.command('bulk-tenants')
+@click.argument('operation', type=click.Choice(OPERATIONS))
+@click.option('--tenant-ids', help='Comma-separated tenant ids.')
+@click.option('--apartment', 'apartment_id', type=int, help='Select the tenants of an apartment.')
+@click.option('--building', 'building_id', type=int, help='Select the tenants of a building.')
+@click.option('--street', 'street_id', type=int, help='Select the tenants of a street.')
+@click.option('--to-apartment', 'target_apartment_id', type=int, help='Target apartment (move).')
+@click.option('--to-building', 'target_building_id', type=int, help='Target building (reassign).')
+@click.option('--date', 'event_date', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Date for the occupancy log (default: today).')
+@click.option('--dry-run', is_flag=True, help='Validate and report, then roll back.')
+@with_appcontext
+def bulk_tenants_command(operation, tenant_ids, apartment_id, building_id, street_id,
+                         target_apartment_id, target_building_id, event_date, dry_run):
+    """Move, reassign or deregister many tenants in one transaction."""
+    try:
+        selection = select_tenants(
+            tenant_ids=[int(i) for i in tenant_ids.split(',')] if tenant_ids else None,
+            apartment_id=apartment_id, building_id=building_id, street_id=street_id
+        )
+        summary = bulk_operation(
+            operation, selection,
+            target_apartment_id=target_apartment_id,
+            target_building_id=target_building_id,
+            event_date=event_date.date() if event_date else None
+        )
+    except ValueError as e:
+        db.session.rollback()
+        raise click.ClickException(str(e))
+
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+    if dry_run:
+        print("dry run: nothing was changed")
 
 
 if __name__ == '__main__':
-    init_db()
-    app.run(debug=True, port=5089)
+    create_app().run(debug=True, port=5089)
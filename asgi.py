@@ -0,0 +1,35 @@
+"""
+ASGI entry point (async serving mode):
+
+    uvicorn asgi:application --port 5089
+
+Certificate routes are served by the async documents app, so one worker
+keeps many downloads in flight while they wait on PostgreSQL and CouchDB.
+Every other route goes to the regular Flask app through asgiref's thread
+pool. The sync mode (`python app.py`) is unchanged.
+"""
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.exceptions import HTTPException
+
+from app import create_app
+from routes.documents_async import create_documents_app
+
+documents_app = create_documents_app()
+wsgi_app = WsgiToAsgi(create_app())
+async_routes = documents_app.url_map.bind('')
+
+
+def is_async_route(scope):
+    try:
+        async_routes.match(scope['path'], method=scope['method'])
+    except HTTPException:
+        return False
+    return True
+
+
+async def application(scope, receive, send):
+    # Lifespan events open/close the async app's connection pools
+    if scope['type'] == 'lifespan' or (scope['type'] == 'http' and is_async_route(scope)):
+        await documents_app(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
@@ -0,0 +1,76 @@
+import base64
+from datetime import datetime
+from urllib.parse import quote
+
+import aiohttp
+from yarl import URL
+from config import Config
+
+
+class AsyncCouchDBClient:
+    """Non-blocking counterpart of CouchDBClient (used by the ASGI mode).
+
+    One instance keeps a pool of HTTP connections and is shared by every
+    request served from the same event loop, so it has to be created
+    inside that loop.
+    """
+
+    def __init__(self, url=None, db_name=None, max_connections=None):
+        url = URL(url or Config.COUCHDB_URL)
+        self.db_name = db_name or Config.COUCHDB_DB
+        self.session = aiohttp.ClientSession(
+            base_url=url.origin(),
+            auth=aiohttp.BasicAuth(url.user, url.password or '') if url.user else None,
+            connector=aiohttp.TCPConnector(
+                limit=max_connections or Config.COUCHDB_MAX_CONNECTIONS
+            ),
+        )
+
+    def _doc_path(self, doc_id):
+        return f"/{self.db_name}/{quote(doc_id, safe='')}"
+
+    async def ensure_db(self):
+        """Create the database if it does not exist yet"""
+        async with self.session.put(f"/{self.db_name}") as response:
+            # 412 = database already exists
+            if response.status != 412:
+                response.raise_for_status()
+
+    async def save_certificate(self, tenant_id, pdf_bytes):
+        # Документ і PDF-вкладення зберігаються одним запитом
+        doc = {
+            "tenant_id": tenant_id,
+            "created_at": datetime.now().isoformat(),
+            "type": "certificate",
+            "_attachments": {
+                f"certificate_{tenant_id}.pdf": {
+                    "content_type": "application/pdf",
+                    "data": base64.b64encode(pdf_bytes).decode("ascii"),
+                }
+            },
+        }
+
+        async with self.session.post(f"/{self.db_name}", json=doc) as response:
+            response.raise_for_status()
+            return (await response.json())["id"]
+
+    async def get_certificate(self, doc_id):
+        """Return (attachment_name, pdf_bytes) or None if there is no such document"""
+        async with self.session.get(
+            self._doc_path(doc_id),
+            params={"attachments": "true"},
+            headers={"Accept": "application/json"},
+        ) as response:
+            if response.status == 404:
+                return None
+            response.raise_for_status()
+            doc = await response.json()
+
+        attachments = doc.get("_attachments")
+        if not attachments:
+            return None
+        attachment_name, attachment = next(iter(attachments.items()))
+        return attachment_name, base64.b64decode(attachment["data"])
+
+    async def aclose(self):
+        await self.session.close()
@@ -0,0 +1,71 @@
+"""
+Cold-start check: import the app and build it with `python -X importtime`,
+then fail if it takes longer than the budget or if a lazily loaded
+subsystem got imported at startup. The best of several runs is used,
+import times are noisy.
+
+    python check_startup.py --budget-ms 600 --runs 5
+"""
+import argparse
+import subprocess
+import sys
+
+# Must only be imported on first use, never at startup
+LAZY_MODULES = ('reportlab', 'couchdb', 'services.certificate_archive')
+
+
+def measure_startup():
+    """
+    Run `import app; app.create_app()` in a fresh interpreter.
+    Returns (total_us, {module: cumulative_us}).
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app; app.create_app()'],
+        capture_output=True, text=True, check=True,
+    )
+    timings = {}
+    total_us = 0
+    started = False
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        timings.setdefault(name.strip(), int(cumulative))
+
+        # Top-level entries from `app` on are imports done by the app itself
+        # (the ones before it are interpreter startup)
+        if name.startswith(' ') and not name.startswith('  '):
+            started = started or name.strip() == 'app'
+            if started:
+                total_us += int(cumulative)
+    return total_us, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=600)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=10, help='show the N slowest imports')
+    args = parser.parse_args()
+
+    total_us, timings = min((measure_startup() for _ in range(args.runs)), key=lambda run: run[0])
+    total_ms = total_us / 1000
+
+    print(f"cold start: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    for name, us in sorted(timings.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    errors = []
+    if total_ms > args.budget_ms:
+        errors.append(f"cold start {total_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    for lazy in LAZY_MODULES:
+        if any(name == lazy or name.startswith(lazy + '.') for name in timings):
+            errors.append(f"'{lazy}' is imported at startup, it should load on first use")
+
+    for error in errors:
+        print(f"FAIL: {error}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,9 @@
 # create_admin.py
-from app import app, db
-from models import User
+from app import create_app
+from models import db, User
 from werkzeug.security import generate_password_hash
 
-with app.app_context():  # Обов'язково створюємо контекст додатка
+with create_app().app_context():  # Обов'язково створюємо контекст додатка
     # Перевіряємо, чи адміністратор вже існує
     admin = User.query.filter_by(username='admin').first()
     if admin:
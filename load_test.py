@@ -0,0 +1,246 @@
+"""
+Load test: certificate downloads (GET /certificates/<doc_id>) in sync vs
+async mode, through the real views:
+
+    python load_test.py --requests 500 --latency 0.02 --concurrency 100
+
+Sync mode is the Flask app serving requests one after another (like one
+sync WSGI worker). Async mode is the Quart documents app serving them
+concurrently on one event loop. Both run in-process through their test
+clients. CouchDB is a local stand-in that answers after a fixed latency.
+PostgreSQL is replaced by a temporary SQLite file (needs aiosqlite), used
+only for the login lookup.
+
+The views do not talk to CouchDB the same way. The sync view makes four
+round trips per download: the server and database checks in
+CouchDBClient(), then the document, then the attachment. The async view
+makes one (document with inline attachment). The report shows
+the round trips per download, so the protocol change can be told apart
+from the concurrency change.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from config import Config
+
+
+class StubCouchDB:
+    """
+    Just enough of the CouchDB HTTP API for both clients, answering every
+    request after a fixed latency.
+    """
+
+    def __init__(self, latency, databases, counter):
+        self.latency = latency
+        self.databases = databases
+        self.counter = counter
+
+    async def handle_connection(self, reader, writer):
+        # HTTP/1.1 keep-alive: serve requests until the client hangs up
+        while request_line := await reader.readline():
+            method, target, _ = request_line.decode().split(' ', 2)
+            headers = {}
+            while (line := await reader.readline()) not in (b'\r\n', b''):
+                name, value = line.decode().split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+            with self.counter.get_lock():
+                self.counter.value += 1
+            await asyncio.sleep(self.latency)
+            status, payload, content_type = self.dispatch(method, target, body)
+            if isinstance(payload, dict):
+                payload = json.dumps(payload).encode()
+            writer.write(
+                f'HTTP/1.1 {status} Stub\r\nContent-Type: {content_type}\r\n'
+                f'Content-Length: {len(payload)}\r\n\r\n'.encode()
+                + (payload if method != 'HEAD' else b'')
+            )
+            await writer.drain()
+        writer.close()
+
+    def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        parts = [unquote(p) for p in url.path.split('/') if p]
+        if not parts:
+            return 200, {'couchdb': 'Welcome'}, 'application/json'
+
+        if method == 'PUT' and len(parts) == 1:
+            if parts[0] in self.databases:
+                return 412, {'error': 'file_exists'}, 'application/json'
+            self.databases[parts[0]] = {}
+            return 201, {'ok': True}, 'application/json'
+
+        db = self.databases.get(parts[0])
+        if db is None:
+            return 404, {'error': 'not_found'}, 'application/json'
+        if len(parts) == 1:
+            if method == 'POST':
+                return self.create_doc(db, json.loads(body))
+            return 200, {'db_name': parts[0], 'doc_count': len(db)}, 'application/json'
+
+        doc = db.get(parts[1])
+        if doc is None:
+            return 404, {'error': 'not_found'}, 'application/json'
+        if len(parts) == 3:
+            if method == 'PUT':
+                doc['_files'][parts[2]] = body
+                return 201, {'ok': True, 'id': parts[1], 'rev': doc['_rev']}, 'application/json'
+            return 200, doc['_files'][parts[2]], 'application/pdf'
+
+        with_data = parse_qs(url.query).get('attachments') == ['true']
+        result = {k: v for k, v in doc.items() if k != '_files'}
+        result['_attachments'] = {
+            name: {'content_type': 'application/pdf', 'length': len(data)}
+            | ({'data': base64.b64encode(data).decode()} if with_data else {'stub': True})
+            for name, data in doc['_files'].items()
+        }
+        return 200, result, 'application/json'
+
+    def create_doc(self, db, doc):
+        doc_id = uuid.uuid4().hex
+        attachments = doc.pop('_attachments', {})
+        doc.update(_id=doc_id, _rev='1-stub', _files={
+            name: base64.b64decode(a['data']) for name, a in attachments.items()
+        })
+        db[doc_id] = doc
+        return 201, {'ok': True, 'id': doc_id, 'rev': doc['_rev']}, 'application/json'
+
+
+def serve_stub_couchdb(latency, db_name, doc_ids, counter, ready):
+    pdf = b'%PDF-1.4 stand-in certificate' + b'\0' * 4096
+    stub = StubCouchDB(latency, {db_name: {
+        doc_id: {
+            '_id': doc_id, '_rev': '1-stub', 'tenant_id': tenant_id, 'type': 'certificate',
+            '_files': {f'certificate_{tenant_id}.pdf': pdf},
+        }
+        for tenant_id, doc_id in enumerate(doc_ids)
+    }}, counter)
+
+    async def serve():
+        server = await asyncio.start_server(stub.handle_connection, '127.0.0.1', 0, backlog=1024)
+        ready.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def start_stub_couchdb(latency, db_name, certificates):
+    """
+    Start the stand-in server with `certificates` stored PDFs.
+    It runs in its own process so it does not share the GIL with the apps.
+    Returns (process, url, doc_ids, counter), `counter` is the number of
+    HTTP requests the stand-in has answered.
+    """
+    doc_ids = [uuid.uuid4().hex for _ in range(certificates)]
+    ready = multiprocessing.Queue()
+    counter = multiprocessing.Value('i', 0)
+    process = multiprocessing.Process(
+        target=serve_stub_couchdb, args=(latency, db_name, doc_ids, counter, ready), daemon=True
+    )
+    process.start()
+    return process, f'http://127.0.0.1:{ready.get()}/', doc_ids, counter
+
+
+def load_test_config(couch_url, workdir):
+    """Config for both apps: SQLite instead of PostgreSQL, the stand-in CouchDB"""
+    # The views build their CouchDB clients from the global Config
+    Config.COUCHDB_URL = couch_url
+
+    class LoadTestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(workdir, 'load_test.sqlite')}"
+        ASYNC_DATABASE_URI = f"sqlite+aiosqlite:///{os.path.join(workdir, 'load_test.sqlite')}"
+        CERTIFICATE_ARCHIVE_DIR = os.path.join(workdir, 'archive')
+
+    return LoadTestConfig
+
+
+def create_login_user(config):
+    """Create the tables and one user, return the user id for the session cookie"""
+    from app import create_app
+    from models import db, User
+
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        user = User(username='load-test', password_hash='-', role='admin')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+def run_sync(config, user_id, doc_ids):
+    from app import create_app
+
+    client = create_app(config).test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+
+    started = time.perf_counter()
+    for doc_id in doc_ids:
+        response = client.get(f'/certificates/{doc_id}')
+        assert response.status_code == 200, response.status_code
+    return time.perf_counter() - started
+
+
+async def run_async(config, user_id, doc_ids, concurrency):
+    from routes.documents_async import create_documents_app
+
+    app = create_documents_app(config)
+    async with app.test_app() as test_app:
+        client = test_app.test_client()
+        async with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+        limit = asyncio.Semaphore(concurrency)
+
+        async def download(doc_id):
+            async with limit:
+                response = await client.get(f'/certificates/{doc_id}')
+                assert response.status_code == 200, response.status_code
+
+        started = time.perf_counter()
+        await asyncio.gather(*(download(doc_id) for doc_id in doc_ids))
+        return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.02, help='stand-in CouchDB latency, seconds')
+    parser.add_argument('--concurrency', type=int, default=100)
+    args = parser.parse_args()
+
+    server, url, doc_ids, counter = start_stub_couchdb(args.latency, Config.COUCHDB_DB, args.requests)
+    with tempfile.TemporaryDirectory() as workdir:
+        config = load_test_config(url, workdir)
+        user_id = create_login_user(config)
+
+        before = counter.value
+        sync_time = run_sync(config, user_id, doc_ids)
+        sync_trips = (counter.value - before) / args.requests
+
+        before = counter.value
+        async_time = asyncio.run(run_async(config, user_id, doc_ids, args.concurrency))
+        async_trips = (counter.value - before) / args.requests
+    server.terminate()
+
+    print(f"{args.requests} downloads, {args.latency * 1000:.0f} ms CouchDB latency")
+    print(f"sync : {sync_time:7.2f} s  {args.requests / sync_time:8.1f} req/s  "
+          f"({sync_trips:.1f} CouchDB round trips per download)")
+    print(f"async: {async_time:7.2f} s  {args.requests / async_time:8.1f} req/s  "
+          f"({async_trips:.1f} CouchDB round trips per download, concurrency {args.concurrency})")
+    # Rough split: sync time is dominated by latency × round trips
+    print(f"speedup: x{sync_time / async_time:.1f} "
+          f"(about x{sync_time / async_time * async_trips / sync_trips:.1f} from concurrency alone)")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,7 @@ class Street(db.Model):
     __tablename__ = 'streets'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
+    district = db.Column(db.String(100), index=True)  # Район (для звітів по районах)
 
     """Кількість будинків на вулиці"""
     @property
@@ -102,3 +103,17 @@ class User(db.Model, UserMixin):
 
     def isAdmin(self):
         return self.role == 'admin'
+
+class OccupancyEvent(db.Model):
+    """Журнал заселень/виселень (лише додавання, записи не змінюються)"""
+    __tablename__ = 'occupancy_events'
+    id = db.Column(db.Integer, primary_key=True)
+    # Без зовнішніх ключів: історія має пережити видалення мешканця чи квартири
+    tenant_id = db.Column(db.Integer, nullable=False)
+    apartment_id = db.Column(db.Integer, nullable=False, index=True)
+    event_type = db.Column(db.String(10), nullable=False)  # "move_in", "move_out"
+    event_date = db.Column(db.Date, nullable=False, default=lambda: datetime.utcnow().date(), index=True)
+
+    __table_args__ = (
+        db.Index('ix_occupancy_events_tenant_date', 'tenant_id', 'event_date', 'id'),
+    )
@@ -2,6 +2,7 @@ from .auth import auth_bp
 from .tenants import tenants_bp
 from .addresses import address_bp
 from .documents import documents_bp
+from .analytics import analytics_bp
 
 
 def register_blueprints(app):
@@ -9,3 +10,4 @@ def register_blueprints(app):
     app.register_blueprint(tenants_bp)
     app.register_blueprint(address_bp)
     app.register_blueprint(documents_bp)
+    app.register_blueprint(analytics_bp)
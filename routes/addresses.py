@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from models import db, Street, Building, Apartment
+from services.occupancy_service import record_move_out
 
 address_bp = Blueprint('addresses', __name__)
 
@@ -15,6 +16,7 @@ def add_address():
     if request.method == 'POST':
         try:
             street_name = request.form['street_name']
+            district = (request.form.get('district') or '').strip() or None
             building_number = request.form['building_number']
             apartment_number = request.form['apartment_number']
             area = request.form['area']
@@ -23,9 +25,16 @@ def add_address():
 
             street = Street.query.filter_by(name=street_name).first()
             if not street:
-                street = Street(name=street_name)
+                street = Street(name=street_name, district=district)
                 db.session.add(street)
                 db.session.commit()
+            elif district and street.district != district:
+                # Район належить вулиці: заповнюємо, якщо порожній, але не перезаписуємо
+                if street.district:
+                    flash(f"Street {street.name} is already in district {street.district}, "
+                          f"the district was not changed.")
+                else:
+                    street.district = district
 
             building = Building.query.filter_by(
                 street_id=street.id, number=building_number
@@ -69,6 +78,10 @@ def delete_address(apartment_id):
         building = apartment.building
         street = building.street
 
+        # Мешканці лишаються без квартири (apartment_id = NULL): фіксуємо виселення
+        for tenant in apartment.tenants:
+            record_move_out(tenant.id, apartment.id)
+
         # Delete apartment
         db.session.delete(apartment)
         db.session.commit()
@@ -106,6 +119,8 @@ def edit_address(apartment_id):
         try:
             # Update street
             street.name = request.form['street_name']
+            if 'district' in request.form:
+                street.district = request.form['district'].strip() or None
             
             # Update building
             building.number = request.form['building_number']
@@ -0,0 +1,38 @@
+from datetime import date
+
+from flask import Blueprint, jsonify, request
+from flask_login import login_required, current_user
+from services.occupancy_service import GROUPINGS, occupancy_analytics
+
+analytics_bp = Blueprint('analytics', __name__)
+
+
+@analytics_bp.route('/analytics/occupancy')
+@login_required
+def occupancy():
+    """
+    Occupancy rate, average tenancy duration and turnover (admin only).
+    Query params: group_by (street | building | ownership_type | month),
+    since / until (YYYY-MM-DD, optional).
+    """
+    if current_user.role != 'admin':
+        return jsonify(error="Access denied"), 403
+
+    group_by = request.args.get('group_by', 'street')
+    if group_by not in GROUPINGS:
+        return jsonify(error=f"group_by must be one of: {', '.join(GROUPINGS)}"), 400
+
+    try:
+        since = request.args.get('since')
+        until = request.args.get('until')
+        since = date.fromisoformat(since) if since else None
+        until = date.fromisoformat(until) if until else None
+    except ValueError:
+        return jsonify(error="since/until must be dates in YYYY-MM-DD format"), 400
+
+    return jsonify(
+        group_by=group_by,
+        since=since.isoformat() if since else None,
+        until=until.isoformat() if until else None,
+        rows=occupancy_analytics(group_by, since, until)
+    )
@@ -0,0 +1,122 @@
+"""
+Async variant of the documents blueprint for the ASGI serving mode.
+
+Certificate downloads mostly wait on PostgreSQL and CouchDB, so here they
+run as coroutines on a Quart app: asyncpg sessions, a shared aiohttp
+connection pool to CouchDB, and ReportLab pushed to a worker thread.
+asgi.py mounts this app next to the regular Flask app.
+"""
+import asyncio
+from functools import wraps
+from urllib.parse import quote
+
+from quart import Quart, Blueprint, current_app, flash, make_response, redirect, request, session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import contains_eager
+
+from async_couchdb_client import AsyncCouchDBClient
+from config import Config
+from models import Tenant, Apartment, Building, User
+from services.certificate_archive import CertificateArchive
+from services.pdf_service import generate_tenant_certificate
+
+documents_async_bp = Blueprint('documents', __name__)
+
+
+def login_required(view):
+    """
+    Quart counterpart of flask_login.login_required.
+    Flask-Login keeps the user id in the signed session cookie, which Quart
+    reads the same way as long as both apps share SECRET_KEY.
+    """
+    @wraps(view)
+    async def wrapped(*args, **kwargs):
+        user_id = session.get('_user_id')
+        user = None
+        if user_id is not None:
+            async with current_app.async_session() as db_session:
+                user = await db_session.get(User, int(user_id))
+
+        if user is None:
+            return redirect(f"/login?next={quote(request.path)}")
+
+        return await view(*args, **kwargs)
+
+    return wrapped
+
+
+@documents_async_bp.route('/tenant/<int:tenant_id>/certificate')
+@login_required
+async def tenant_certificate(tenant_id):
+    query = (
+        select(Tenant)
+        .join(Tenant.apartment)
+        .join(Apartment.building)
+        .join(Building.street)
+        .options(
+            contains_eager(Tenant.apartment)
+            .contains_eager(Apartment.building)
+            .contains_eager(Building.street)
+        )
+        .where(Tenant.id == tenant_id)
+    )
+    async with current_app.async_session() as db_session:
+        tenant = (await db_session.execute(query)).scalar_one_or_none()
+
+    if not tenant:
+        await flash("Tenant not found!")
+        return redirect('/tenants')
+
+    # ReportLab is CPU-bound, keep it off the event loop
+    pdf = await asyncio.to_thread(generate_tenant_certificate, tenant)
+
+    await current_app.couch.save_certificate(tenant_id, pdf)
+
+    response = await make_response(pdf)
+    response.headers['Content-Type'] = 'application/pdf'
+    response.headers['Content-Disposition'] = f'attachment; filename=certificate_{tenant_id}.pdf'
+    return response
+
+
+@documents_async_bp.route('/certificates/<doc_id>')
+@login_required
+async def get_certificate(doc_id):
+    certificate = await current_app.couch.get_certificate(doc_id)
+    if certificate is None:
+        # Old certificates live in the local archive. The lookup takes a lock,
+        # may re-read the index and faults pages in from disk: keep it off the loop
+        certificate = await asyncio.to_thread(current_app.archive.get, doc_id)
+    if certificate is None:
+        await flash("Document not found")
+        return redirect('/certificates')
+
+    attachment_name, pdf = certificate
+
+    response = await make_response(pdf)
+    response.headers['Content-Type'] = 'application/pdf'
+    response.headers['Content-Disposition'] = f"attachment; filename={attachment_name}"
+    return response
+
+
+def create_documents_app(config=Config):
+    """Build the Quart app serving the async documents routes"""
+    app = Quart(__name__, static_folder=None)
+    app.config.from_object(config)
+    app.register_blueprint(documents_async_bp)
+
+    @app.before_serving
+    async def open_connections():
+        # Engine and HTTP pool are bound to the serving event loop
+        app.async_engine = create_async_engine(config.ASYNC_DATABASE_URI, pool_size=20, max_overflow=30)
+        app.async_session = async_sessionmaker(app.async_engine, expire_on_commit=False)
+        app.couch = AsyncCouchDBClient()
+        await app.couch.ensure_db()
+        app.archive = CertificateArchive(config.CERTIFICATE_ARCHIVE_DIR)
+
+    @app.after_serving
+    async def close_connections():
+        await app.couch.aclose()
+        await app.async_engine.dispose()
+
+    return app
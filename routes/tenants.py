@@ -1,6 +1,10 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from datetime import date
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from models import db, Tenant, Apartment, Building, Street
+from services.occupancy_service import record_move_in, record_move_out
+from services.bulk_tenants import bulk_operation, select_tenants
 
 # Create blueprint for tenants
 tenants_bp = Blueprint('tenants', __name__)
@@ -53,6 +57,8 @@ def add_tenant():
                 apartment_id=request.form['apartment_id']
             )
             db.session.add(tenant)
+            db.session.flush()  # потрібен tenant.id для журналу заселень
+            record_move_in(tenant.id, tenant.apartment_id, tenant.registration_date)
             db.session.commit()
             flash("Tenant added!")
             return redirect(url_for('tenants.tenants_list'))
@@ -79,6 +85,8 @@ def delete_tenant(tenant_id):
 
     tenant = Tenant.query.get_or_404(tenant_id)
     try:
+        if tenant.apartment_id:
+            record_move_out(tenant.id, tenant.apartment_id)
         db.session.delete(tenant)
         db.session.commit()
         flash("Tenant deleted!")
@@ -107,7 +115,14 @@ def edit_tenant(tenant_id):
             tenant.passport_number = request.form['passport_number']
             tenant.phone = request.form.get('phone')
             tenant.registration_date = request.form['registration_date']
-            tenant.apartment_id = request.form['apartment_id']
+
+            # Переселення фіксуємо в журналі, а не лише перезаписуємо квартиру
+            new_apartment_id = int(request.form['apartment_id'])
+            if tenant.apartment_id != new_apartment_id:
+                if tenant.apartment_id:
+                    record_move_out(tenant.id, tenant.apartment_id)
+                record_move_in(tenant.id, new_apartment_id)
+                tenant.apartment_id = new_apartment_id
 
             db.session.commit()
             flash("Tenant updated!")
@@ -131,4 +146,69 @@ def edit_tenant(tenant_id):
             'street_name': apt.building.street.name if apt.building and apt.building.street else ''
         })
 
-    return render_template("tenant_form.html", tenant=tenant, apartments=apartment_list)
\ No newline at end of file
+    return render_template("tenant_form.html", tenant=tenant, apartments=apartment_list)
+
+# -------------------------------
+# Bulk operations (JSON API)
+# -------------------------------
+@tenants_bp.route('/tenants/bulk', methods=['POST'])
+@login_required
+def bulk_tenants():
+    """
+    Move, reassign or deregister many tenants in one transaction (admin only).
+    JSON body: operation (move | reassign | deregister), one selector
+    (tenant_ids | apartment_id | building_id | street_id), target_apartment_id
+    for move, target_building_id for reassign, optional event_date
+    (YYYY-MM-DD) and dry_run.
+    """
+    if current_user.role != 'admin':
+        return jsonify(error="Access denied"), 403
+
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify(error="Expected a JSON object"), 400
+    try:
+        event_date = data.get('event_date')
+        if event_date is not None and not isinstance(event_date, str):
+            raise ValueError("event_date must be a date in YYYY-MM-DD format")
+        event_date = date.fromisoformat(event_date) if event_date else None
+
+        tenant_ids = data.get('tenant_ids')
+        if tenant_ids is not None:
+            if not isinstance(tenant_ids, list):
+                raise ValueError("tenant_ids must be a list of integers")
+            tenant_ids = [_json_int(value, 'tenant_ids') for value in tenant_ids]
+
+        selection = select_tenants(
+            tenant_ids=tenant_ids,
+            apartment_id=_json_int(data.get('apartment_id'), 'apartment_id'),
+            building_id=_json_int(data.get('building_id'), 'building_id'),
+            street_id=_json_int(data.get('street_id'), 'street_id')
+        )
+        summary = bulk_operation(
+            data.get('operation'), selection,
+            target_apartment_id=_json_int(data.get('target_apartment_id'), 'target_apartment_id'),
+            target_building_id=_json_int(data.get('target_building_id'), 'target_building_id'),
+            event_date=event_date
+        )
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify(error=str(e)), 400
+
+    if data.get('dry_run'):
+        db.session.rollback()
+    else:
+        db.session.commit()
+    return jsonify(dry_run=bool(data.get('dry_run')), **summary)
+
+
+def _json_int(value, name):
+    """Id from a JSON body: an integer or a string of digits, None if missing"""
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"{name}: {value!r} is not an integer id")
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name}: {value!r} is not an integer id")
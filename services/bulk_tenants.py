@@ -0,0 +1,221 @@
+"""
+Bulk tenant operations: move, reassign and deregister a whole selection
+(tenant ids, an apartment, a building or a street) at once.
+
+The selection is locked and read once, capacity is checked before anything
+is written, then the changes go out as a few set-based statements (arrays
+are passed as single parameters and unnested by PostgreSQL). Nothing is
+committed here: the caller commits or rolls back, so an operation is one
+transaction.
+"""
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import ARRAY, Date, Integer, any_, bindparam, delete, func, insert, literal, select, update
+
+from models import db, Tenant, Apartment, Building, User, OccupancyEvent
+from services.occupancy_service import MOVE_IN, MOVE_OUT, invalidate_cache
+
+SELECTORS = ('tenant_ids', 'apartment_id', 'building_id', 'street_id')
+OPERATIONS = ('move', 'reassign', 'deregister')
+
+
+def bulk_operation(operation, selection, target_apartment_id=None, target_building_id=None, event_date=None):
+    """Run one of OPERATIONS on a select_tenants() selection, returns a summary dict"""
+    if operation == 'move':
+        if target_apartment_id is None:
+            raise ValueError("move needs a target apartment")
+        return move_tenants(selection, target_apartment_id, event_date)
+    if operation == 'reassign':
+        if target_building_id is None:
+            raise ValueError("reassign needs a target building")
+        return reassign_tenants(selection, target_building_id, event_date)
+    if operation == 'deregister':
+        return deregister_tenants(selection, event_date)
+    raise ValueError(f"operation must be one of: {', '.join(OPERATIONS)}")
+
+
+def select_tenants(tenant_ids=None, apartment_id=None, building_id=None, street_id=None):
+    """SELECT of tenant ids for exactly one selector"""
+    given = [name for name, value in zip(SELECTORS, (tenant_ids, apartment_id, building_id, street_id))
+             if value is not None]
+    if len(given) != 1:
+        raise ValueError(f"Select tenants by exactly one of: {', '.join(SELECTORS)}")
+
+    query = select(Tenant.id)
+    if tenant_ids is not None:
+        return query.where(Tenant.id == any_(_int_array(tenant_ids)))
+    if apartment_id is not None:
+        return query.where(Tenant.apartment_id == apartment_id)
+
+    apartments = select(Apartment.id)
+    if building_id is not None:
+        apartments = apartments.where(Apartment.building_id == building_id)
+    else:
+        apartments = apartments.join(Building).where(Building.street_id == street_id)
+    return query.where(Tenant.apartment_id.in_(apartments))
+
+
+def move_tenants(selection, apartment_id, event_date=None):
+    """Move every selected tenant into one apartment"""
+    selected = _lock_selected(selection)
+    apartment = db.session.execute(
+        select(Apartment.id, _capacity()).where(Apartment.id == apartment_id).with_for_update()
+    ).first()
+    if apartment is None:
+        raise ValueError(f"Apartment {apartment_id} does not exist")
+
+    movers = [(tenant_id, old) for tenant_id, old in selected if old != apartment_id]
+    occupants = db.session.scalar(select(func.count(Tenant.id)).where(Tenant.apartment_id == apartment_id))
+    free = apartment.capacity - occupants
+    if len(movers) > free:
+        raise ValueError(f"Apartment {apartment_id} has room for {max(free, 0)} more tenants, "
+                         f"{len(movers)} selected")
+
+    _apply_moves([(tenant_id, old, apartment_id) for tenant_id, old in movers], event_date)
+    return {
+        'operation': 'move',
+        'selected': len(selected),
+        'moved': len(movers),
+        'target_apartment_id': apartment_id,
+        'free_places_left': free - len(movers),
+    }
+
+
+def reassign_tenants(selection, building_id, event_date=None):
+    """
+    Spread the selected tenants over the free places of a building,
+    filling its apartments in order. Tenants already living in the
+    building stay where they are.
+    """
+    selected = _lock_selected(selection)
+    locked = db.session.scalars(
+        select(Apartment.id).where(Apartment.building_id == building_id).with_for_update()
+    ).all()
+    if not locked:
+        raise ValueError(f"Building {building_id} does not exist or has no apartments")
+
+    occupants = func.count(Tenant.id)
+    apartments = db.session.execute(
+        select(Apartment.id, _capacity(), occupants.label('occupants'))
+        .outerjoin(Tenant, Tenant.apartment_id == Apartment.id)
+        .where(Apartment.building_id == building_id)
+        .group_by(Apartment.id)
+        .order_by(Apartment.id)
+    ).all()
+
+    in_building = set(locked)
+    movers = [(tenant_id, old) for tenant_id, old in selected if old not in in_building]
+    free = sum(max(a.capacity - a.occupants, 0) for a in apartments)
+    if len(movers) > free:
+        raise ValueError(f"Building {building_id} has room for {free} more tenants, {len(movers)} selected")
+
+    plan = []
+    placed = []
+    queue = iter(movers)
+    for apartment in apartments:
+        places = max(apartment.capacity - apartment.occupants, 0)
+        batch = [(tenant_id, old, apartment.id) for _, (tenant_id, old) in zip(range(places), queue)]
+        if batch:
+            plan.extend(batch)
+            placed.append({'apartment_id': apartment.id, 'moved_in': len(batch)})
+        if len(plan) == len(movers):
+            break
+
+    _apply_moves(plan, event_date)
+    return {
+        'operation': 'reassign',
+        'selected': len(selected),
+        'moved': len(plan),
+        'target_building_id': building_id,
+        'apartments': placed,
+        'free_places_left': free - len(plan),
+    }
+
+
+def deregister_tenants(selection, event_date=None):
+    """Delete the selected tenants, log their move-outs and unlink their user accounts"""
+    selected = _lock_selected(selection)
+    ids = _int_array([tenant_id for tenant_id, _ in selected])
+
+    move_outs = db.session.execute(
+        insert(OccupancyEvent).from_select(
+            ['tenant_id', 'apartment_id', 'event_type', 'event_date'],
+            select(Tenant.id, Tenant.apartment_id, literal(MOVE_OUT), literal(_event_date(event_date), Date))
+            .where(Tenant.id == any_(ids), Tenant.apartment_id.isnot(None))
+            .order_by(Tenant.id)
+        ).returning(OccupancyEvent.id)
+    )
+    move_outs = len(move_outs.all())  # rowcount is not reliable for INSERT ... SELECT
+
+    # Акаунти лишаються, але без прив'язки до видаленого мешканця
+    users_unlinked = db.session.execute(
+        update(User).where(User.tenant_id == any_(ids)).values(tenant_id=None),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    deleted = db.session.execute(
+        delete(Tenant).where(Tenant.id == any_(ids)),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    invalidate_cache()
+
+    return {
+        'operation': 'deregister',
+        'selected': len(selected),
+        'deregistered': deleted,
+        'move_outs_logged': move_outs,
+        'users_unlinked': users_unlinked,
+    }
+
+
+def _lock_selected(selection):
+    """(tenant_id, apartment_id) of the selection, locked until the transaction ends"""
+    return [tuple(row) for row in db.session.execute(
+        select(Tenant.id, Tenant.apartment_id).where(Tenant.id.in_(selection))
+        .order_by(Tenant.id).with_for_update()
+    )]
+
+
+def _capacity():
+    """How many tenants an apartment can take (TENANTS_PER_ROOM per room)"""
+    return (func.coalesce(Apartment.rooms, 1) * current_app.config['TENANTS_PER_ROOM']).label('capacity')
+
+
+def _apply_moves(plan, event_date):
+    """
+    Log move-out/move-in events and update apartments for a plan of
+    (tenant_id, old_apartment_id, new_apartment_id): three statements
+    whatever the size of the plan.
+    """
+    if not plan:
+        return
+    tenant_ids, old_ids, new_ids = zip(*plan)
+    moves = func.unnest(
+        _int_array(tenant_ids), _int_array(old_ids), _int_array(new_ids)
+    ).table_valued('tenant_id', 'old_apartment_id', 'new_apartment_id').render_derived()
+    event_date = literal(_event_date(event_date), Date)
+    columns = ['tenant_id', 'apartment_id', 'event_type', 'event_date']
+
+    # move_out перед move_in: журнал упорядковує події одного дня за id
+    db.session.execute(insert(OccupancyEvent).from_select(
+        columns,
+        select(moves.c.tenant_id, moves.c.old_apartment_id, literal(MOVE_OUT), event_date)
+        .where(moves.c.old_apartment_id.isnot(None))
+    ))
+    db.session.execute(insert(OccupancyEvent).from_select(
+        columns,
+        select(moves.c.tenant_id, moves.c.new_apartment_id, literal(MOVE_IN), event_date)
+    ))
+    db.session.execute(
+        update(Tenant).where(Tenant.id == moves.c.tenant_id).values(apartment_id=moves.c.new_apartment_id),
+        execution_options={'synchronize_session': False}
+    )
+    invalidate_cache()
+
+
+def _int_array(values):
+    return bindparam(None, list(values), type_=ARRAY(Integer))
+
+
+def _event_date(event_date):
+    return event_date or datetime.utcnow().date()
@@ -0,0 +1,332 @@
+"""
+Cold storage for old certificates.
+
+Certificates older than CERTIFICATE_ARCHIVE_AGE_DAYS are moved out of
+CouchDB into append-only pack files in CERTIFICATE_ARCHIVE_DIR:
+
+    pack-00001.pack   zlib-compressed PDFs, one after another
+    index.jsonl       one JSON line per certificate: doc_id, tenant_id,
+                      created_at, filename, pack, offset, length, sha256
+
+Packs are read through mmap, so a lookup is a dict hit plus a slice.
+Only the archive/compact commands write (guarded by a lock file); the web
+app only reads and picks up a new index when the file changes.
+"""
+import hashlib
+import json
+import mmap
+import os
+import re
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+INDEX_FILE = 'index.jsonl'
+LOCK_FILE = 'archive.lock'
+PACK_PATTERN = re.compile(r'^pack-(\d+)\.pack$')
+
+# ReportLab stamps every PDF with its build time and a random file ID
+VOLATILE_PDF_FIELDS = re.compile(
+    rb"/(?:CreationDate|ModDate) \(D:[^)]*\)|\[<[0-9a-f]{32}><[0-9a-f]{32}>\]"
+)
+
+
+def get_archive(app):
+    """The app's CertificateArchive, created on first use"""
+    archive = app.extensions.get('certificate_archive')
+    if archive is None:
+        archive = app.extensions.setdefault('certificate_archive', CertificateArchive(
+            app.config['CERTIFICATE_ARCHIVE_DIR'], app.config['CERTIFICATE_PACK_MAX_BYTES']
+        ))
+    return archive
+
+
+def certificate_digest(pdf_bytes):
+    """Hash of a certificate ignoring ReportLab's timestamps and file ID"""
+    return hashlib.sha256(VOLATILE_PDF_FIELDS.sub(b'', pdf_bytes)).hexdigest()
+
+
+class CertificateArchive:
+    def __init__(self, path, pack_max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.pack_max_bytes = pack_max_bytes
+        self._lock = threading.Lock()
+        self._index = {}
+        self._index_stat = None
+        self._maps = {}
+
+    # ---------- reading ----------
+
+    def get(self, doc_id):
+        """Return (filename, pdf_bytes) or None if the certificate is not archived"""
+        with self._lock:
+            entry = self._index.get(doc_id)
+            if entry is None and self._reload_index():
+                entry = self._index.get(doc_id)
+            if entry is None:
+                return None
+
+            try:
+                data = self._read(entry)
+            except FileNotFoundError:
+                # The pack was compacted away since our index was loaded
+                self._reload_index()
+                entry = self._index.get(doc_id)
+                if entry is None:
+                    return None
+                data = self._read(entry)
+
+        return entry['filename'], zlib.decompress(data)
+
+    def _read(self, entry):
+        start, end = entry['offset'], entry['offset'] + entry['length']
+        mapped = self._maps.get(entry['pack'])
+        if mapped is None or len(mapped) < end:
+            # Not mapped yet, or the pack has grown since it was mapped
+            if mapped is not None:
+                mapped.close()
+            with open(os.path.join(self.path, entry['pack']), 'rb') as pack:
+                mapped = mmap.mmap(pack.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[entry['pack']] = mapped
+        return mapped[start:end]
+
+    def _reload_index(self):
+        """Re-read index.jsonl if it changed on disk. Returns True if it was reloaded."""
+        try:
+            stat = os.stat(os.path.join(self.path, INDEX_FILE))
+        except FileNotFoundError:
+            return False
+        key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        if key == self._index_stat:
+            return False
+
+        self._index = self._load_index()
+        self._index_stat = key
+        for mapped in self._maps.values():
+            mapped.close()
+        self._maps = {}
+        return True
+
+    def _load_index(self):
+        index = {}
+        with open(os.path.join(self.path, INDEX_FILE), encoding='utf-8') as f:
+            for line in f:
+                if line.endswith('\n'):  # a torn last line is still being written
+                    entry = json.loads(line)
+                    index[entry['doc_id']] = entry
+        return index
+
+    # ---------- writing (archive / compact commands) ----------
+
+    @contextmanager
+    def writer(self):
+        """Exclusive write access to the archive"""
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, LOCK_FILE), 'w') as lock:
+            _lock_file(lock)
+            try:
+                with self._lock:
+                    self._reload_index()
+                yield _ArchiveWriter(self)
+            finally:
+                _unlock_file(lock)
+
+    def _packs(self):
+        return sorted(name for name in os.listdir(self.path) if PACK_PATTERN.match(name))
+
+    def _pack_name(self, number):
+        return f'pack-{number:05d}.pack'
+
+
+def _lock_file(lock):
+    """Block until we hold the exclusive lock on an open lock file"""
+    if fcntl:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return
+    lock.seek(0)
+    while True:
+        try:
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            pass  # LK_LOCK gives up after ~10 s, keep waiting
+
+
+def _unlock_file(lock):
+    if fcntl:
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    else:
+        lock.seek(0)
+        msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class _ArchiveWriter:
+    def __init__(self, archive):
+        self.archive = archive
+
+    def append(self, certificates):
+        """
+        Append certificates to the current pack: an iterable of dicts with
+        doc_id, tenant_id, created_at, filename and pdf.
+        Data is on disk before its index lines, so readers never see an
+        entry that points past the end of a pack.
+        """
+        archive = self.archive
+        packs = archive._packs()
+        number = int(PACK_PATTERN.match(packs[-1]).group(1)) if packs else 1
+
+        entries = []
+        pack = None
+        try:
+            for certificate in certificates:
+                if pack is None or pack.tell() >= archive.pack_max_bytes:
+                    if pack is not None:
+                        number += 1
+                        self._close(pack)
+                    pack = open(os.path.join(archive.path, archive._pack_name(number)), 'ab')
+
+                data = zlib.compress(certificate['pdf'], 9)
+                entries.append({
+                    'doc_id': certificate['doc_id'],
+                    'tenant_id': certificate['tenant_id'],
+                    'created_at': certificate['created_at'],
+                    'filename': certificate['filename'],
+                    'pack': archive._pack_name(number),
+                    'offset': pack.tell(),
+                    'length': len(data),
+                    'sha256': certificate_digest(certificate['pdf']),
+                })
+                pack.write(data)
+        finally:
+            if pack is not None:
+                self._close(pack)
+
+        with open(os.path.join(archive.path, INDEX_FILE), 'a', encoding='utf-8') as index:
+            index.writelines(json.dumps(entry) + '\n' for entry in entries)
+            index.flush()
+            os.fsync(index.fileno())
+
+        with archive._lock:
+            for entry in entries:
+                archive._index[entry['doc_id']] = entry
+        return entries
+
+    def compact(self):
+        """
+        Rewrite the packs keeping one copy of each distinct PDF per tenant.
+        Duplicates (same tenant, same content) stay retrievable: their index
+        entries point at the surviving copy. Returns a summary dict.
+        """
+        archive = self.archive
+        old_packs = archive._packs()
+        bytes_before = sum(os.path.getsize(os.path.join(archive.path, p)) for p in old_packs)
+        entries = sorted(archive._index.values(), key=lambda e: e['created_at'], reverse=True)
+
+        number = int(PACK_PATTERN.match(old_packs[-1]).group(1)) + 1 if old_packs else 1
+        new_entries = []
+        survivors = {}  # (tenant_id, sha256) -> location of the newest copy
+        pack = None
+        try:
+            for entry in entries:
+                key = (entry['tenant_id'], entry['sha256'])
+                if key not in survivors:
+                    if pack is None or pack.tell() >= archive.pack_max_bytes:
+                        if pack is not None:
+                            number += 1
+                            self._close(pack)
+                        pack = open(os.path.join(archive.path, archive._pack_name(number)), 'wb')
+                    data = archive._read(entry)
+                    survivors[key] = {'pack': archive._pack_name(number), 'offset': pack.tell(), 'length': len(data)}
+                    pack.write(data)
+                new_entries.append({**entry, **survivors[key]})
+        finally:
+            if pack is not None:
+                self._close(pack)
+
+        index_path = os.path.join(archive.path, INDEX_FILE)
+        with open(index_path + '.tmp', 'w', encoding='utf-8') as index:
+            index.writelines(json.dumps(entry) + '\n' for entry in reversed(new_entries))
+            index.flush()
+            os.fsync(index.fileno())
+        os.replace(index_path + '.tmp', index_path)
+
+        for mapped in archive._maps.values():
+            mapped.close()
+        archive._maps = {}
+        for name in old_packs:
+            try:
+                os.remove(os.path.join(archive.path, name))
+            except PermissionError:
+                # Windows: another process still has the pack mapped. Nothing
+                # in the index points at it any more, the next compaction removes it.
+                pass
+        archive._reload_index()
+
+        return {
+            'certificates': len(new_entries),
+            'unique_pdfs': len(survivors),
+            'bytes_before': bytes_before,
+            'bytes_after': sum(os.path.getsize(os.path.join(archive.path, p)) for p in archive._packs()),
+        }
+
+    @staticmethod
+    def _close(pack):
+        pack.flush()
+        os.fsync(pack.fileno())
+        pack.close()
+
+
+def archive_old_certificates(couch, archive, older_than_days, batch_size=200):
+    """
+    Move certificates older than `older_than_days` from CouchDB to the archive.
+    Each batch is written to the pack and index before it is deleted from
+    CouchDB. Returns the number of archived certificates.
+    """
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).isoformat()
+    archived = 0
+
+    with archive.writer() as writer:
+        batch = []
+        for row in couch.db.iterview('_all_docs', batch_size, include_docs=True):
+            doc = row.doc
+            # Без created_at вік невідомий: такий документ не архівуємо
+            created_at = doc.get('created_at')
+            if doc.get('type') != 'certificate' or not created_at or created_at >= cutoff:
+                continue
+            batch.append(doc)
+            if len(batch) == batch_size:
+                archived += _archive_batch(couch, archive, writer, batch)
+                batch = []
+        if batch:
+            archived += _archive_batch(couch, archive, writer, batch)
+
+    return archived
+
+
+def _archive_batch(couch, archive, writer, docs):
+    # Archived by an interrupted run: only the CouchDB delete is missing
+    done = [doc for doc in docs if doc.id in archive._index]
+    certificates = []
+    for doc in docs:
+        if doc.id in archive._index or not doc.get('_attachments'):
+            continue
+        done.append(doc)
+        filename = next(iter(doc['_attachments']))
+        certificates.append({
+            'doc_id': doc.id,
+            'tenant_id': doc.get('tenant_id'),
+            'created_at': doc['created_at'],
+            'filename': filename,
+            'pdf': couch.db.get_attachment(doc, filename).read(),
+        })
+    writer.append(certificates)
+
+    couch.db.update([{'_id': doc.id, '_rev': doc.rev, '_deleted': True} for doc in done])
+    return len(certificates)
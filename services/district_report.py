@@ -0,0 +1,201 @@
+"""
+District report engine.
+
+Streets are sorted once, split into shards, and every shard is computed on
+a worker pool with its own app context (so its own DB session and pooled
+connection). Shards come back as plain dicts and are merged in the sorted
+street order.
+
+REPORT_EXECUTOR selects the pool: "thread" (default, cheap to start, DB
+waits overlap) or "process" (ORM work spreads across all cores).
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask, current_app
+from sqlalchemy import func
+
+from models import db, Street, Building, Apartment, Tenant
+
+SHARDS_PER_WORKER = 4
+
+_process_pool = None
+_worker_app = None
+
+
+def build_district_report(sort_by='name_asc', district=None, streets=None):
+    """
+    Report rows for the district_report template, one per street, in the
+    `sort_by` order. `district` and `streets` (list of names) narrow the
+    report down to a slice.
+    """
+    street_ids = _sorted_street_ids(sort_by, district, streets)
+    if not street_ids:
+        return []
+
+    app = current_app._get_current_object()
+    workers = app.config['REPORT_WORKERS'] or os.cpu_count() or 1
+    shard_size = -(-len(street_ids) // (workers * SHARDS_PER_WORKER))
+    shards = [street_ids[i:i + shard_size] for i in range(0, len(street_ids), shard_size)]
+
+    if len(shards) == 1:
+        rows = _shard_rows(shards[0])
+    elif app.config['REPORT_EXECUTOR'] == 'process':
+        pool = _get_process_pool(app, workers)
+        rows = [row for shard_rows in pool.map(_run_shard_in_process, shards) for row in shard_rows]
+    else:
+        # Return the request's connection before the shard threads take theirs,
+        # and never start more threads than the pool has connections
+        db.session.commit()
+        threads = min(workers, len(shards), _pool_size() or workers)
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = pool.map(lambda shard: _run_shard_in_thread(app, shard), shards)
+            rows = [row for shard_rows in results for row in shard_rows]
+
+    by_street = {row['street']['id']: row for row in rows}
+    return [by_street[street_id] for street_id in street_ids]
+
+
+def list_districts():
+    return [d for (d,) in db.session.query(Street.district).filter(
+        Street.district.isnot(None)
+    ).distinct().order_by(Street.district)]
+
+
+def _sorted_street_ids(sort_by, district, streets):
+    query = db.session.query(Street.id)
+    if district:
+        query = query.filter(Street.district == district)
+    if streets:
+        query = query.filter(Street.name.in_(streets))
+
+    # Сортування
+    if sort_by == 'name_desc':
+        query = query.order_by(Street.name.desc())
+    elif sort_by in ('tenants_asc', 'tenants_desc'):
+        # Сортування за кількістю мешканців
+        count = func.count(Tenant.id)
+        query = query.outerjoin(Building).outerjoin(Apartment).outerjoin(Tenant).group_by(Street.id) \
+            .order_by(count.asc() if sort_by == 'tenants_asc' else count.desc())
+    elif sort_by in ('apartments_asc', 'apartments_desc'):
+        # Сортування за кількістю квартир
+        count = func.count(Apartment.id)
+        query = query.outerjoin(Building).outerjoin(Apartment).group_by(Street.id) \
+            .order_by(count.asc() if sort_by == 'apartments_asc' else count.desc())
+    elif sort_by in ('buildings_asc', 'buildings_desc'):
+        # Сортування за кількістю будівель
+        count = func.count(Building.id)
+        query = query.outerjoin(Building).group_by(Street.id) \
+            .order_by(count.asc() if sort_by == 'buildings_asc' else count.desc())
+    else:
+        # За замовчуванням сортування за назвою
+        query = query.order_by(Street.name.asc())
+
+    return [street_id for (street_id,) in query.all()]
+
+
+def _shard_rows(street_ids):
+    """
+    Report rows for one shard: four set-based queries instead of one
+    query per building/apartment, returned as plain dicts so they can
+    leave the worker's session (or process).
+    """
+    streets = db.session.query(Street.id, Street.name, Street.district) \
+        .filter(Street.id.in_(street_ids)).all()
+    buildings = db.session.query(Building.id, Building.street_id, Building.number) \
+        .filter(Building.street_id.in_(street_ids)).order_by(Building.number).all()
+    apartments = db.session.query(
+        Apartment.id, Apartment.building_id, Apartment.number, Apartment.area,
+        Apartment.rooms, Apartment.ownership_type
+    ).filter(Apartment.building_id.in_([b.id for b in buildings])).order_by(Apartment.number).all()
+    tenants = db.session.query(
+        Tenant.id, Tenant.apartment_id, Tenant.first_name, Tenant.last_name
+    ).filter(Tenant.apartment_id.in_([a.id for a in apartments])).order_by(Tenant.id).all()
+
+    tenants_by_apartment = {}
+    for t in tenants:
+        tenants_by_apartment.setdefault(t.apartment_id, []).append({
+            'id': t.id,
+            'first_name': t.first_name,
+            'last_name': t.last_name,
+            'full_name': f"{t.first_name} {t.last_name}"
+        })
+
+    apartments_by_building = {}
+    for a in apartments:
+        apartment_tenants = tenants_by_apartment.get(a.id, [])
+        apartments_by_building.setdefault(a.building_id, []).append({
+            'apartment': {
+                'id': a.id,
+                'number': a.number,
+                'area': a.area,
+                'rooms': a.rooms,
+                'ownership_type': a.ownership_type
+            },
+            'tenants': apartment_tenants,
+            'is_occupied': bool(apartment_tenants),
+            'status': "Occupied" if apartment_tenants else "Vacant"
+        })
+
+    buildings_by_street = {}
+    for b in buildings:
+        building_apartments = apartments_by_building.get(b.id, [])
+        buildings_by_street.setdefault(b.street_id, []).append({
+            'building': {'id': b.id, 'number': b.number},
+            'apartments': building_apartments,
+            'apartment_count': len(building_apartments)
+        })
+
+    rows = []
+    for s in streets:
+        street_buildings = buildings_by_street.get(s.id, [])
+        rows.append({
+            'street': {'id': s.id, 'name': s.name, 'district': s.district},
+            'buildings': street_buildings,
+            'total_tenants': sum(len(a['tenants']) for b in street_buildings for a in b['apartments']),
+            'building_count': len(street_buildings)
+        })
+    return rows
+
+
+def _pool_size():
+    """Connections the engine keeps (None for pools without a fixed size)"""
+    size = getattr(db.engine.pool, 'size', None)
+    return size() if callable(size) else None
+
+
+def _run_shard_in_thread(app, street_ids):
+    # Own app context = own scoped session and pooled connection
+    with app.app_context():
+        return _shard_rows(street_ids)
+
+
+def _get_process_pool(app, workers):
+    global _process_pool
+    if _process_pool is None:
+        # Only the "process" executor needs multiprocessing: import it on first use
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        db_config = {k: v for k, v in app.config.items() if k.startswith('SQLALCHEMY_')}
+        # spawn, not fork: forked children would share the parent's DB sockets
+        _process_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_process_worker,
+            initargs=(db_config,)
+        )
+    return _process_pool
+
+
+def _init_process_worker(db_config):
+    """Each worker process gets a minimal app with its own engine"""
+    global _worker_app
+    _worker_app = Flask(__name__)
+    _worker_app.config.update(db_config)
+    db.init_app(_worker_app)
+
+
+def _run_shard_in_process(street_ids):
+    with _worker_app.app_context():
+        return _shard_rows(street_ids)
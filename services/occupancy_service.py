@@ -0,0 +1,338 @@
+"""
+Occupancy history: the append-only move-in/move-out log and the analytics
+built on it.
+
+Aggregates are computed by PostgreSQL (window functions + GROUP BY), not in
+Python. Each result is cached in process memory for ANALYTICS_CACHE_TTL
+seconds (at most CACHE_MAX_ENTRIES results). A commit that records events
+drops this process's cache; other workers catch up when their entries expire.
+"""
+import threading
+import time
+from datetime import date, datetime
+
+from flask import current_app
+from sqlalchemy import (
+    Date, Float, Integer, and_, case, cast, distinct, event, func, insert, literal, literal_column, or_, select,
+    union_all
+)
+from sqlalchemy.orm import Session
+
+from models import db, OccupancyEvent, Tenant, Apartment, Building, Street
+
+MOVE_IN = 'move_in'
+MOVE_OUT = 'move_out'
+
+GROUPINGS = ('street', 'building', 'ownership_type', 'month')
+
+ONE_MONTH = literal_column("interval '1 month'")
+
+CACHE_MAX_ENTRIES = 128
+
+_cache = {}
+_cache_lock = threading.Lock()
+_cache_generation = 0  # bumped on every clear
+
+
+def invalidate_cache():
+    """Drop cached results once the current transaction commits"""
+    db.session.info['occupancy_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _clear_cache_after_commit(session):
+    # Не раніше: запит між очищенням і комітом закешував би старі цифри
+    global _cache_generation
+    if session.info.pop('occupancy_changed', False):
+        with _cache_lock:
+            _cache.clear()
+            _cache_generation += 1
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changes_after_rollback(session):
+    session.info.pop('occupancy_changed', None)
+
+
+def record_move_in(tenant_id, apartment_id, event_date=None):
+    """Add a move-in event to the session, the caller commits it"""
+    _record(tenant_id, apartment_id, MOVE_IN, event_date)
+
+
+def record_move_out(tenant_id, apartment_id, event_date=None):
+    """Add a move-out event to the session, the caller commits it"""
+    _record(tenant_id, apartment_id, MOVE_OUT, event_date)
+
+
+def _record(tenant_id, apartment_id, event_type, event_date):
+    db.session.add(OccupancyEvent(
+        tenant_id=tenant_id,
+        apartment_id=apartment_id,
+        event_type=event_type,
+        event_date=event_date or datetime.utcnow().date()
+    ))
+    invalidate_cache()
+
+
+def backfill_move_ins():
+    """Log a move-in on the registration date for tenants that have no events yet"""
+    has_events = select(OccupancyEvent.id).where(OccupancyEvent.tenant_id == Tenant.id).exists()
+    result = db.session.execute(
+        insert(OccupancyEvent).from_select(
+            ['tenant_id', 'apartment_id', 'event_type', 'event_date'],
+            select(Tenant.id, Tenant.apartment_id, literal(MOVE_IN), Tenant.registration_date)
+            .where(Tenant.apartment_id.isnot(None), ~has_events)
+        ).returning(OccupancyEvent.id)
+    )
+    invalidate_cache()
+    # rowcount is not reliable for INSERT ... SELECT
+    return len(result.all())
+
+
+def occupancy_analytics(group_by, since=None, until=None):
+    """
+    Occupancy rate, average tenancy duration and turnover per street,
+    building, ownership type or month, for the period [since, until].
+    """
+    if group_by not in GROUPINGS:
+        raise ValueError(f"group_by must be one of: {', '.join(GROUPINGS)}")
+    until = until or datetime.utcnow().date()
+
+    key = (group_by, since, until)
+    ttl = current_app.config['ANALYTICS_CACHE_TTL']
+    with _cache_lock:
+        cached = _cache.get(key)
+        generation = _cache_generation
+    if cached and time.monotonic() - cached[0] < ttl:
+        return cached[1]
+
+    if group_by == 'month':
+        query = _monthly_query(since, until)
+    else:
+        query = _grouped_query(group_by, since, until)
+
+    rows = [_format_row(row) for row in db.session.execute(query).mappings()]
+    _store(key, rows, ttl, generation)
+    return rows
+
+
+def _store(key, rows, ttl, generation):
+    """Cache a result, dropping expired entries and then the oldest ones over the limit"""
+    now = time.monotonic()
+    with _cache_lock:
+        if generation != _cache_generation:
+            return  # events were committed while we queried: the rows may be stale
+        for expired in [k for k, (stored_at, _) in _cache.items() if now - stored_at >= ttl]:
+            del _cache[expired]
+        _cache.pop(key, None)
+        while len(_cache) >= CACHE_MAX_ENTRIES:
+            del _cache[next(iter(_cache))]
+        _cache[key] = (now, rows)
+
+
+def _stays():
+    """One row per tenancy: move-in date and the tenant's next event date (move-out)"""
+    ended_on = func.lead(OccupancyEvent.event_date).over(
+        partition_by=OccupancyEvent.tenant_id,
+        order_by=(OccupancyEvent.event_date, OccupancyEvent.id)
+    )
+    events = select(
+        OccupancyEvent.apartment_id,
+        OccupancyEvent.event_type,
+        OccupancyEvent.event_date.label('started_on'),
+        ended_on.label('ended_on')
+    ).subquery()
+
+    return select(
+        events.c.apartment_id, events.c.started_on, events.c.ended_on
+    ).where(events.c.event_type == MOVE_IN).subquery('stays')
+
+
+def _dimension(group_by):
+    """(key, label) columns of a grouping over apartments ⋈ buildings ⋈ streets"""
+    if group_by == 'street':
+        return Street.id, Street.name
+    if group_by == 'building':
+        return Building.id, func.concat(Street.name, ', ', Building.number)
+    return Apartment.ownership_type, Apartment.ownership_type
+
+
+def _grouped_query(group_by, since, until):
+    key, label = _dimension(group_by)
+    until = literal(until, Date)
+    stays = _stays()
+
+    apartments = (
+        select(Apartment.id.label('apartment_id'), key.label('key'), label.label('label'))
+        .join(Building, Apartment.building_id == Building.id)
+        .join(Street, Building.street_id == Street.id)
+        .subquery('apartments')
+    )
+
+    totals = (
+        select(apartments.c.key, apartments.c.label, func.count().label('apartments'))
+        .group_by(apartments.c.key, apartments.c.label)
+        .subquery()
+    )
+
+    active = and_(
+        stays.c.started_on <= until,
+        or_(stays.c.ended_on.is_(None), stays.c.ended_on > until)
+    )
+    in_period = stays.c.started_on <= until
+    if since:
+        in_period = and_(in_period, or_(stays.c.ended_on.is_(None), stays.c.ended_on >= since))
+    tenancy = (
+        select(
+            apartments.c.key,
+            func.count(distinct(stays.c.apartment_id)).filter(active).label('occupied'),
+            func.avg(func.coalesce(stays.c.ended_on, until) - stays.c.started_on)
+            .filter(in_period).label('avg_tenancy_days')
+        )
+        .join(stays, stays.c.apartment_id == apartments.c.apartment_id)
+        .group_by(apartments.c.key)
+        .subquery()
+    )
+
+    event_in_period = OccupancyEvent.event_date <= until
+    if since:
+        event_in_period = and_(event_in_period, OccupancyEvent.event_date >= since)
+    moves = (
+        select(
+            apartments.c.key,
+            func.count().filter(OccupancyEvent.event_type == MOVE_IN).label('move_ins'),
+            func.count().filter(OccupancyEvent.event_type == MOVE_OUT).label('move_outs')
+        )
+        .join(OccupancyEvent, OccupancyEvent.apartment_id == apartments.c.apartment_id)
+        .where(event_in_period)
+        .group_by(apartments.c.key)
+        .subquery()
+    )
+
+    return _with_rates(
+        select(
+            totals.c.key,
+            totals.c.label,
+            totals.c.apartments,
+            func.coalesce(tenancy.c.occupied, 0).label('occupied'),
+            tenancy.c.avg_tenancy_days,
+            func.coalesce(moves.c.move_ins, 0).label('move_ins'),
+            func.coalesce(moves.c.move_outs, 0).label('move_outs')
+        )
+        .outerjoin(tenancy, tenancy.c.key == totals.c.key)
+        .outerjoin(moves, moves.c.key == totals.c.key)
+    )
+
+
+def _monthly_query(since, until):
+    """
+    Month-end figures from running sums (window SUM over months) of
+    per-month deltas, so the cost grows with the number of events,
+    not with months × tenancies.
+    """
+    stays = _stays()
+    epoch = literal(date(1970, 1, 1), Date)
+
+    def month_of(column):
+        return cast(func.date_trunc('month', column), Date)
+
+    # Occupants of an apartment after each of its events: the apartment
+    # becomes occupied on 0 → 1 and vacant on 1 → 0
+    occupants = func.sum(case((OccupancyEvent.event_type == MOVE_IN, 1), else_=-1)).over(
+        partition_by=OccupancyEvent.apartment_id,
+        order_by=(OccupancyEvent.event_date, OccupancyEvent.id)
+    )
+    events = select(
+        OccupancyEvent.event_type, OccupancyEvent.event_date, occupants.label('occupants')
+    ).subquery()
+    moved_in = events.c.event_type == MOVE_IN
+    moved_out = events.c.event_type == MOVE_OUT
+
+    # Deltas: occupied apartments, move-ins, move-outs, active tenancies
+    # and the sum of their start dates (for the average duration)
+    zero = literal(0)
+    started_days = stays.c.started_on - epoch
+    deltas = union_all(
+        select(
+            month_of(events.c.event_date).label('month_start'),
+            case((and_(moved_in, events.c.occupants == 1), 1),
+                 (and_(moved_out, events.c.occupants == 0), -1), else_=0).label('occupied'),
+            case((moved_in, 1), else_=0).label('move_ins'),
+            case((moved_out, 1), else_=0).label('move_outs'),
+            zero.label('tenancies'),
+            zero.label('started_days')
+        ),
+        select(month_of(stays.c.started_on), zero, zero, zero, literal(1), started_days),
+        select(month_of(stays.c.ended_on), zero, zero, zero, literal(-1), -started_days)
+        .where(stays.c.ended_on.isnot(None))
+    ).subquery('deltas')
+    per_month = select(
+        deltas.c.month_start,
+        *(func.sum(deltas.c[name]).label(name)
+          for name in ('occupied', 'move_ins', 'move_outs', 'tenancies', 'started_days'))
+    ).group_by(deltas.c.month_start).subquery('per_month')
+
+    first_month = func.date_trunc('month', func.least(
+        select(func.min(OccupancyEvent.event_date)).scalar_subquery(), literal(since, Date)
+    ))
+    month = func.generate_series(first_month, func.date_trunc('month', literal(until, Date)), ONE_MONTH) \
+        .column_valued('month')
+    months = select(
+        cast(month, Date).label('month_start'),
+        cast(month + ONE_MONTH, Date).label('month_end')
+    ).subquery('months')
+
+    def running(name):
+        return func.sum(func.coalesce(per_month.c[name], 0)).over(order_by=months.c.month_start)
+
+    totals = (
+        select(
+            months.c.month_start,
+            months.c.month_end,
+            cast(running('occupied'), Integer).label('occupied'),
+            running('tenancies').label('tenancies'),
+            running('started_days').label('started_days'),
+            func.coalesce(per_month.c.move_ins, 0).label('move_ins'),
+            func.coalesce(per_month.c.move_outs, 0).label('move_outs')
+        )
+        .select_from(months)
+        .outerjoin(per_month, per_month.c.month_start == months.c.month_start)
+        .subquery('totals')
+    )
+
+    # Average age at month end of the tenancies active at that moment
+    avg_tenancy_days = (totals.c.month_end - epoch) - totals.c.started_days / func.nullif(totals.c.tenancies, 0)
+
+    query = select(
+        totals.c.month_start.label('key'),
+        func.to_char(totals.c.month_start, 'YYYY-MM').label('label'),
+        select(func.count(Apartment.id)).scalar_subquery().label('apartments'),
+        totals.c.occupied,
+        avg_tenancy_days.label('avg_tenancy_days'),
+        totals.c.move_ins,
+        totals.c.move_outs
+    )
+    if since:
+        query = query.where(totals.c.month_start >= month_of(literal(since, Date)))
+    return _with_rates(query)
+
+
+def _with_rates(query):
+    """Wrap a per-group query, add occupancy_rate and turnover, order by label"""
+    groups = query.subquery('groups')
+    apartments = func.nullif(groups.c.apartments, 0)
+    return select(
+        groups,
+        (cast(groups.c.occupied, Float) / apartments).label('occupancy_rate'),
+        (cast(groups.c.move_outs, Float) / apartments).label('turnover')
+    ).order_by(groups.c.label)
+
+
+def _format_row(row):
+    row = dict(row)
+    if hasattr(row['key'], 'isoformat'):
+        row['key'] = row['key'].isoformat()
+    for name in ('occupancy_rate', 'turnover', 'avg_tenancy_days'):
+        if row[name] is not None:
+            row[name] = round(float(row[name]), 3 if name != 'avg_tenancy_days' else 1)
+    return row